@@ -1,4 +1,4 @@
-import os, sys, subprocess, importlib.util, re
+import os, importlib.util, json, logging
 from dotenv import load_dotenv
 
 # --- Step 0: Disable CrewAI fallback early ---
@@ -6,12 +6,15 @@ os.environ["CREWAI_DEFAULT_LLM_PROVIDER"] = "groq"
 os.environ["CREWAI_DISABLE_LITELLM_FALLBACK"] = "1"
 os.environ["CREWAI_TELEMETRY_ENABLED"] = "0"
 
-# --- Step 1: Preload LiteLLM (Render-safe, correct version) ---
-if importlib.util.find_spec("litellm") is None:
-    print("⚙️ Installing LiteLLM (Render-safe)...")
-    subprocess.run([sys.executable, "-m", "pip", "install", "litellm>=1.50.0"], check=False)
-else:
-    print("✅ LiteLLM preloaded successfully")
+# --- Step 1: LiteLLM is pinned in requirements.txt; fail fast if it is missing ---
+try:
+    import litellm  # noqa: F401
+except ImportError as e:
+    raise ImportError("❌ litellm is not installed — run `pip install -r requirements.txt`.") from e
+
+from utils import LOG_LEVEL
+log = logging.getLogger(__name__)
+log.setLevel(LOG_LEVEL)
 
 # --- Step 2: Load .env and Groq key ---
 load_dotenv()
@@ -27,16 +30,21 @@ if spec:
         # Prevent CrewAI from overwriting our Groq LLM
         return obj
     llm_utils.create_llm = safe_create_llm
-    print("✅ CrewAI LLM creation patched successfully")
+    log.info("✅ CrewAI LLM creation patched successfully")
 
 # --- Step 4: Initialize Groq LLM directly ---
+import httpx
 from langchain_groq import ChatGroq
+# one keep-alive connection pool for the whole process, so requests after the
+# first skip the TLS handshake
+http_client = httpx.Client(limits=httpx.Limits(max_keepalive_connections=10), timeout=60)
 llm = ChatGroq(
     model="groq/llama-3.3-70b-versatile",
     api_key=os.getenv("GROQ_API_KEY"),
-    temperature=0.3
+    temperature=0.3,
+    http_client=http_client
 )
-print("✅ Groq LLM initialized successfully")
+log.info("✅ Groq LLM initialized successfully")
 
 # --- Step 5: Import CrewAI AFTER patch ---
 from crewai import Agent, Task, Crew
@@ -46,6 +54,9 @@ from analyzer import analyze_repository
 # -----------------------------
 # Helper to clean output text
 # -----------------------------
+_CLEAN_TABLE = str.maketrans({"•": "-", "–": "-", "—": "-", "`": None})
+
+
 def clean_text(data):
     """Recursively remove emojis, non-ASCII chars, and normalize to plain text."""
     if isinstance(data, list):
@@ -54,16 +65,16 @@ def clean_text(data):
         return {k: clean_text(v) for k, v in data.items()}
     elif data is None:
         return ""
-    
+
     # Convert to string
-    text = str(data)
+    text = data if isinstance(data, str) else str(data)
 
-    # Remove emoji and non-ASCII safely
-    text = re.sub(r"[^\x00-\x7F]+", "", text)
+    # Normalize bullets/dashes and strip markdown backticks in one pass
+    text = text.translate(_CLEAN_TABLE)
 
-    # Extra cleanup — strip CrewAI markers or markdown leftovers
-    text = re.sub(r"`+", "", text)
-    text = text.replace("•", "-").replace("–", "-").replace("—", "-")
+    # Remove emoji and any remaining non-ASCII safely
+    if not text.isascii():
+        text = text.encode("ascii", "ignore").decode("ascii")
 
     return text.strip()
 
@@ -71,20 +82,6 @@ def clean_text(data):
 # -----------------------------
 # AGENTS (with no-emoji constraint)
 # -----------------------------
-StaticAgent = Agent(
-    role="Static Analysis Expert",
-    goal=(
-        "Analyze the repository and extract Pylint, Bandit, and Radon results. "
-        "Write your output using plain text only — do not include emojis, icons, "
-        "or special Unicode characters. Use clear English and markdown formatting if needed."
-    ),
-    backstory=(
-        "You are a senior code reviewer who runs static tools and summarizes issues "
-        "in a professional, technical manner without any decorative symbols."
-    ),
-    llm=llm
-)
-
 ReasoningAgent = Agent(
     role="Code Reviewer AI",
     goal=(
@@ -114,37 +111,82 @@ SummarizerAgent = Agent(
 )
 
 
+# -----------------------------
+# STATIC REPORT
+# -----------------------------
+def summarize_analysis(analysis: dict, per_tool: int = 40) -> dict:
+    """Condense analyze_repository() output into a compact, prompt-sized report."""
+    root = analysis.get("repo_dir", "")
+
+    def rel(p):
+        return os.path.relpath(p, root) if root and os.path.isabs(p) else p
+
+    pylint = [
+        {"file": rel(e["file"]), "line": i.get("line"), "symbol": i.get("symbol"), "message": i.get("message")}
+        for e in analysis.get("pylint", []) for i in e.get("issues", [])
+    ]
+    bandit = [
+        {"file": rel(i.get("filename", "")), "line": i.get("line_number"),
+         "severity": i.get("issue_severity"), "message": i.get("issue_text")}
+        for i in analysis.get("bandit", {}).get("results", [])
+    ]
+    radon = [
+        {"file": rel(f), "name": b.get("name"), "line": b.get("lineno"), "rank": b.get("rank")}
+        for f, blocks in analysis.get("radon", {}).items() if isinstance(blocks, list)
+        for b in blocks if b.get("rank", "A") not in ("A", "B")
+    ]
+    return {
+        "files_analyzed": len(analysis.get("pylint", [])),
+        "counts": {"pylint": len(pylint), "bandit": len(bandit), "radon_complex_blocks": len(radon)},
+        "pylint": pylint[:per_tool],
+        "bandit": bandit[:per_tool],
+        "radon": radon[:per_tool],
+    }
+
+
+def format_static_report(report: dict) -> str:
+    """Plain-text rendering of summarize_analysis() for the PDF's static section."""
+    c = report["counts"]
+    lines = [
+        f"Files analyzed: {report['files_analyzed']}",
+        f"Pylint issues: {c['pylint']}  |  Bandit findings: {c['bandit']}  |  "
+        f"Complex blocks (rank C or worse): {c['radon_complex_blocks']}",
+    ]
+    for i in report["bandit"]:
+        lines.append(f"- [bandit/{i['severity']}] {i['file']}:{i['line']} {i['message']}")
+    for i in report["radon"]:
+        lines.append(f"- [radon/{i['rank']}] {i['file']}:{i['line']} {i['name']}")
+    for i in report["pylint"]:
+        lines.append(f"- [pylint/{i['symbol']}] {i['file']}:{i['line']} {i['message']}")
+    return "\n".join(lines)
+
+
 # -----------------------------
 # MAIN WORKFLOW
 # -----------------------------
 def analyze_repo_with_agents(repo_url: str):
-    print("⚙️ Running StaticAgent...")
+    log.info("⚙️ Running static analysis...")
     analysis = analyze_repository(repo_url)
+    report = summarize_analysis(analysis)
 
     # --- Tasks ---
-    static_task = Task(
-        description=(
-            f"Run static analysis on {repo_url} and explain the Pylint, Bandit, "
-            f"and Radon results clearly using plain text (no emojis)."
-        ),
-        expected_output="Detailed explanation of static analysis results in plain text.",
-        agent=StaticAgent
-    )
-
+    # the static report is computed locally and handed straight to the reviewer,
+    # so no LLM hop is spent restating it
     reasoning_task = Task(
         description=(
-            f"Read the static analysis report for {repo_url} and provide improvements, "
-            f"reasoning, and refactor suggestions in plain text (no emojis)."
+            f"Read this static analysis report (Pylint, Bandit, Radon) for {repo_url} "
+            f"and provide improvements, reasoning, and refactor suggestions in plain text "
+            f"(no emojis).\n\nReport (JSON):\n{json.dumps(report)[:8000]}"
         ),
         expected_output="Structured AI review with actionable feedback in clean text.",
-        agent=ReasoningAgent,
-        context=[static_task]
+        agent=ReasoningAgent
     )
 
     summary_task = Task(
         description=(
             f"Summarize repository health, list detected issues, and recommendations, "
-            f"and assign a numeric score (1–10). Output must be plain text — no emojis."
+            f"and assign a numeric score written as 'Score: N/10' (N from 1 to 10). "
+            f"Output must be plain text — no emojis."
         ),
         expected_output="Full summary with numeric quality score in ASCII text.",
         agent=SummarizerAgent,
@@ -153,16 +195,16 @@ def analyze_repo_with_agents(repo_url: str):
 
     # --- Crew Workflow ---
     crew = Crew(
-        agents=[StaticAgent, ReasoningAgent, SummarizerAgent],
-        tasks=[static_task, reasoning_task, summary_task],
-        verbose=True
+        agents=[ReasoningAgent, SummarizerAgent],
+        tasks=[reasoning_task, summary_task],
+        verbose=False  # per-event stdout writes block the run; enable only when debugging
     )
 
-    print("🚀 Running DevMate CrewAI Workflow...")
+    log.info("🚀 Running DevMate CrewAI Workflow...")
     result = crew.kickoff()
 
     # --- Clean all outputs ---
-    static_output = clean_text(static_task.output)
+    static_output = clean_text(format_static_report(report))
     reasoning_output = clean_text(reasoning_task.output)
     summary_output = clean_text(summary_task.output)
 
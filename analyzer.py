@@ -1,59 +1,160 @@
-import os, json, subprocess, sys
+import os, subprocess, sys, hashlib, logging
+from concurrent.futures import ThreadPoolExecutor
 from git import Repo
-from utils import make_workdir, list_py_files
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    import ijson
+from utils import LOG_LEVEL, locked, available_cpus, clone_cache_dir, sweep_clone_cache, clean_dir, list_py_files, file_hash, cache_get, cache_put
 
-def run_cmd(cmd, cwd=None):
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
-    return p.returncode, p.stdout, p.stderr
+log = logging.getLogger(__name__)
+log.setLevel(LOG_LEVEL)
+
+def stream_json(cmd, prefix="item", kv=False, cwd=None):
+    """Run cmd and yield JSON values under prefix as they arrive on its stdout."""
+    # binary pipe with a large buffer: ijson decodes bytes itself, so no text-mode decode pass
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         bufsize=1 << 20)
+    try:
+        parse = ijson.kvitems if kv else ijson.items
+        yield from parse(p.stdout, prefix, use_float=True)
+    finally:
+        p.stdout.close()
+        p.wait()
 
 def clone_repo(git_url:str)->str:
-    workdir = make_workdir()
-    print(f"📂 Cloning repo: {git_url}")
-    Repo.clone_from(git_url, workdir, depth=1)
+    sweep_clone_cache()
+    workdir = clone_cache_dir(git_url)
+    if os.path.isdir(os.path.join(workdir, ".git")):
+        log.info("📂 Updating cached clone: %s", git_url)
+        try:
+            repo = Repo(workdir)
+            repo.git.fetch("--depth=1", "--filter=blob:none", "origin", "HEAD")
+            repo.git.reset("--hard", "FETCH_HEAD")
+            os.utime(workdir)  # mark as recently used for the cache sweep
+            return workdir
+        except Exception as e:
+            log.warning("⚠️ Cached clone unusable, re-cloning: %s", e)
+            clean_dir(workdir)
+    log.info("📂 Cloning repo: %s", git_url)
+    os.makedirs(os.path.dirname(workdir), exist_ok=True)
+    # blobless shallow clone that only checks out Python sources; the blobs for
+    # other files are never downloaded
+    try:
+        repo = Repo.clone_from(git_url, workdir, depth=1, filter="blob:none", sparse=True)
+        repo.git.sparse_checkout("set", "--no-cone", "*.py")
+    except Exception as e:
+        # older git has no --sparse / --no-cone; fall back to a plain shallow clone
+        log.warning("⚠️ Sparse clone unavailable, cloning everything: %s", e)
+        clean_dir(workdir)
+        Repo.clone_from(git_url, workdir, depth=1)
     return workdir
 
+def _collect_pylint(files):
+    """Lint files in one pylint process; issues per file, or None if the output was unusable."""
+    cmd = [sys.executable, "-m", "pylint", *files,
+           f"--jobs={min(len(files), available_cpus())}", "--output-format=json"]
+    by_path = {os.path.abspath(f): [] for f in files}
+    try:
+        for iss in stream_json(cmd):
+            by_path.setdefault(os.path.abspath(iss.get("path", "")), []).append(iss)
+    except Exception as e:
+        log.warning("⚠️ Error parsing pylint output: %s", e)
+        return None
+    return {f: by_path[os.path.abspath(f)] for f in files}
+
 def run_pylint(root):
+    files = list(list_py_files(root))
+    if not files:
+        return []
+    rels = {f: os.path.relpath(f, root) for f in files}
+    # many checks (imports, duplicate code, inferred members and call signatures) look at
+    # other modules, so the result is only reusable for an identical tree; the key covers
+    # every file's path and content
+    digest = hashlib.sha256()
+    for f in sorted(files, key=rels.get):
+        digest.update(f"{rels[f]}:{file_hash(f)}\n".encode())
+    key = "tree-" + digest.hexdigest()
+
+    cached = cache_get("pylint", key)
+    if cached is None:
+        # one interpreter lints every file and forks its own workers, sharing astroid caches
+        log.info("🔍 Running pylint on %d files", len(files))
+        fresh = _collect_pylint(files)
+        cached = {rels[f]: found for f, found in (fresh or {}).items()}
+        if fresh is not None:
+            cache_put("pylint", key, cached)
+
     results = []
-    for i, f in enumerate(list_py_files(root)):
-        # if i >= 2:  # limit for speed
-        #     break
-        print("🔍 Running pylint on", f)
-        cmd = [sys.executable, "-m", "pylint", f, "--output-format=json"]
-        code, out, err = run_cmd(cmd)
-        try:
-            issues = json.loads(out or "[]")
-        except Exception as e:
-            print("⚠️ Error parsing pylint output:", e)
-            issues = []
-        results.append({"file": f, "issues": issues})
+    for f in files:
+        found = cached.get(rels[f], [])
+        for iss in found:
+            # cached entries may come from another checkout of the same tree
+            iss["path"] = f
+        results.append({"file": f, "issues": found})
     return results
 
 def run_bandit(root):
-    print("🛡️ Running bandit...")
-    cmd = [sys.executable, "-m", "bandit", "-r", root, "-f", "json"]
-    code, out, err = run_cmd(cmd)
+    # bandit scans the whole tree, so key on the hashes of every file in it
+    files = sorted(list_py_files(root))
+    if not files:
+        return {"results": []}
+    digest = hashlib.sha256(root.encode())  # bandit reports absolute filenames
+    for f in files:
+        digest.update(f"{os.path.relpath(f, root)}:{file_hash(f)}\n".encode())
+    key = digest.hexdigest()
+    cached = cache_get("bandit", key)
+    if cached is not None:
+        return cached
+    log.info("🛡️ Running bandit...")
+    cmd = [sys.executable, "-m", "bandit", "-f", "json", *files]
     try:
-        return json.loads(out or "{}")
-    except:
+        # only the findings are used downstream; skip bandit's metrics section
+        result = {"results": list(stream_json(cmd, "results.item"))}
+    except Exception:
         return {"results": []}
+    cache_put("bandit", key, result)
+    return result
 
 def run_radon_complexity(root):
-    print("📈 Running radon complexity...")
-    cmd = [sys.executable, "-m", "radon", "cc", "-j", root]
-    code, out, err = run_cmd(cmd)
+    results, todo = {}, {}
+    for f in list_py_files(root):
+        h = file_hash(f)
+        cached = cache_get("radon", h)
+        if cached is None:
+            todo[f] = h
+        elif cached:
+            results[f] = cached
+    if not todo:
+        return results
+    log.info("📈 Running radon complexity...")
+    cmd = [sys.executable, "-m", "radon", "cc", "-j", *todo]
     try:
-        return json.loads(out or "{}")
-    except:
-        return {}
+        for f, blocks in stream_json(cmd, "", kv=True):
+            results[f] = blocks
+            if f in todo and isinstance(blocks, list):
+                cache_put("radon", todo.pop(f), blocks)
+    except Exception:
+        return results
+    # radon leaves out files without any blocks; remember those as empty too
+    for f, h in todo.items():
+        if f not in results:
+            cache_put("radon", h, [])
+    return results
 
 def analyze_repository(git_url:str)->dict:
-    repo_dir = clone_repo(git_url)
-    pylint_findings = run_pylint(repo_dir)
-    bandit_findings = run_bandit(repo_dir)
-    radon_findings = run_radon_complexity(repo_dir)
+    # the cached checkout is shared per URL; keep other requests for the same repo
+    # from resetting or deleting it while this one is still analyzing
+    with locked(clone_cache_dir(git_url)):
+        repo_dir = clone_repo(git_url)
+        # the three tools are independent subprocesses over the same checkout
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            pylint_future = ex.submit(run_pylint, repo_dir)
+            bandit_future = ex.submit(run_bandit, repo_dir)
+            radon_future = ex.submit(run_radon_complexity, repo_dir)
     return {
         "repo_dir": repo_dir,
-        "pylint": pylint_findings,
-        "bandit": bandit_findings,
-        "radon": radon_findings,
+        "pylint": pylint_future.result(),
+        "bandit": bandit_future.result(),
+        "radon": radon_future.result(),
     }
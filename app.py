@@ -1,18 +1,14 @@
 # ✅ app.py (Render-ready, CrewAI stable)
-import os, sys, subprocess, importlib.util
+import os, re, logging
 from dotenv import load_dotenv
 
-# --- Preload environment + LiteLLM early ---
+# --- Preload environment early ---
 load_dotenv()
 os.environ["CREWAI_DEFAULT_LLM_PROVIDER"] = "groq"
 os.environ["CREWAI_DISABLE_LITELLM_FALLBACK"] = "1"
 os.environ["CREWAI_TELEMETRY_ENABLED"] = "0"
-
-if importlib.util.find_spec("litellm") is None:
-    print("⚙️ Installing LiteLLM (Render-safe)...")
-    subprocess.run([sys.executable, "-m", "pip", "install", "litellm>=1.50.0"], check=False)
-else:
-    print("✅ LiteLLM preloaded successfully")
+# module loggers pick their level from DEVMATE_LOG_LEVEL (WARNING by default)
+logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
 from flask import Flask, render_template, request, redirect, url_for, flash
 from datetime import datetime
@@ -122,27 +118,48 @@ def contact():
 
 
 # ---------- Utility ----------
+_SCORE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*/\s*10\b")
+_LABELLED_SCORE_RE = re.compile(
+    r"\bscore\s*[:=]?\s*(\d+(?:\.\d+)?)(?:\s*/\s*10\b|(?!\.?\d|\s*/))", re.IGNORECASE
+)
+
+
+def _find_score(text):
+    # prefer a labelled "Score: N" or "Score: N/10", then any bare "N/10"
+    for pattern in (_LABELLED_SCORE_RE, _SCORE_RE):
+        for m in pattern.finditer(text):
+            val = float(m.group(1))
+            if 0 < val <= 10:
+                return round(val, 2)
+    return None
+
+
 def extract_score(text):
     """Extract numeric score from any format (string, list, or dict)."""
     if isinstance(text, list):
-        text = " ".join(
-            t.get("suggestion", "") if isinstance(t, dict) else str(t)
-            for t in text
+        # the summarizer is asked for "Score: N/10"; ratios in the static report or review
+        # text must not win over it
+        summaries = " ".join(
+            str(t.get("suggestion", "")) for t in text
+            if isinstance(t, dict) and t.get("type") == "summary"
         )
-    elif isinstance(text, dict):
-        text = text.get("suggestion", "") or text.get("result", "") or str(text)
-    else:
-        text = str(text)
-
-    for token in text.split():
-        if "/10" in token or token.replace(".", "", 1).isdigit():
-            try:
-                val = float(token.strip("/10"))
-                if 0 < val <= 10:
-                    return round(val, 2)
-            except ValueError:
-                continue
-    return 7.5
+        score = _find_score(summaries)
+        if score is not None:
+            return score
+
+    if not isinstance(text, str):
+        if isinstance(text, list):
+            text = " ".join(
+                t.get("suggestion", "") if isinstance(t, dict) else str(t)
+                for t in text
+            )
+        elif isinstance(text, dict):
+            text = text.get("suggestion", "") or text.get("result", "") or str(text)
+        else:
+            text = str(text)
+
+    score = _find_score(text)
+    return 7.5 if score is None else score
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
@@ -1,102 +1,190 @@
-import os, time
+import os, re, json, shelve, hashlib, threading, asyncio, logging
 from dotenv import load_dotenv
+from utils import CACHE_ROOT, LOG_LEVEL, locked
+
+log = logging.getLogger(__name__)
+log.setLevel(LOG_LEVEL)
 
 load_dotenv()
-from groq import Groq
+from groq import AsyncGroq
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 USE_LLM = bool(GROQ_API_KEY)
-client = Groq(api_key=GROQ_API_KEY) if USE_LLM else None
 MODEL = "llama3-70b-8192"
+MAX_CONCURRENCY = 8  # stay under Groq's requests-per-minute limit
+BATCH_SIZE = 25      # findings packed into a single chat request
+
+SYSTEM_PROMPT = (
+    "You are DevMate, a senior Python code reviewer. You receive a JSON array of issues "
+    "with fields id, kind, file, line, msg and symbol. For every issue explain briefly why "
+    "it is a problem and give a minimal safe fix. Reply with a JSON object of the form "
+    '{"suggestions": [{"id": <id>, "suggestion": "<short Why + Fix>"}]}.'
+)
+
+# -------- response cache --------
+# suggestions are kept in memory and in a shelve on disk so they survive restarts.
+# dbm does not support concurrent writers, so disk access is serialized by a thread
+# lock within a process and a file lock across gunicorn workers
+LLM_CACHE_PATH = os.path.join(CACHE_ROOT, "llm_cache")
+_LLM_CACHE = {}
+_cache_lock = threading.Lock()
+_NUMBERS = re.compile(r"\d+")
+
+def _cache_lookup(keys) -> dict:
+    found = {k: _LLM_CACHE[k] for k in keys if k in _LLM_CACHE}
+    missing = [k for k in keys if k not in found]
+    if missing:
+        with _cache_lock, locked(LLM_CACHE_PATH):
+            try:
+                with shelve.open(LLM_CACHE_PATH, "r") as db:
+                    found.update({k: db[k] for k in missing if k in db})
+            except Exception:
+                pass
+        _LLM_CACHE.update(found)
+    return found
+
+def _cache_store(entries: dict):
+    if not entries:
+        return
+    _LLM_CACHE.update(entries)
+    with _cache_lock, locked(LLM_CACHE_PATH):
+        try:
+            with shelve.open(LLM_CACHE_PATH) as db:
+                db.update(entries)
+        except Exception as e:
+            log.warning("⚠️ Could not persist LLM cache: %s", e)
+
+def class_key(item) -> str:
+    """Cache key for a finding that ignores where it occurs (file, line, digits in the message)."""
+    msg = _NUMBERS.sub("N", item.get("msg", ""))
+    raw = f"{MODEL}|{item.get('kind')}|{item.get('symbol')}|{msg}"
+    return "issue:" + hashlib.sha256(raw.encode()).hexdigest()
 
 # -------- offline fallback --------
+_HINTS = [
+    ("line-too-long", "line too long", "Keep lines ≤ 100 chars. Break long expressions or strings."),
+    ("missing-module-docstring", "missing module docstring", "Add a top-level docstring describing purpose & usage."),
+    ("missing-class-docstring", "missing class docstring", "Add a short docstring summarizing the class."),
+    ("wildcard-import", "wildcard import", "Avoid 'from X import *'; import only needed names."),
+    ("import-error", "unable to import", "Install or correctly reference the missing module."),
+]
+_HINT_BY_SYMBOL = {sym: hint for sym, _, hint in _HINTS}
+_DEFAULT_HINT = "Review and refactor for clarity; follow PEP-8 and security best practices."
+
 def offline_hint(issue):
+    hint = _HINT_BY_SYMBOL.get(issue.get("symbol"))
+    if hint:
+        return hint
+    # findings without a pylint symbol fall back to matching the message text
     msg = (issue.get("message") or "").lower()
-    if "line too long" in msg:
-        return "Keep lines ≤ 100 chars. Break long expressions or strings."
-    if "missing module docstring" in msg:
-        return "Add a top-level docstring describing purpose & usage."
-    if "missing class docstring" in msg:
-        return "Add a short docstring summarizing the class."
-    if "wildcard import" in msg:
-        return "Avoid 'from X import *'; import only needed names."
-    if "unable to import" in msg:
-        return "Install or correctly reference the missing module."
-    return "Review and refactor for clarity; follow PEP-8 and security best practices."
+    return next((hint for _, needle, hint in _HINTS if needle in msg), _DEFAULT_HINT)
 
 # -------- chat helper --------
-def _chat(prompt: str, retries=3):
+async def _achat(client, payload: str, sem: asyncio.Semaphore, retries=3):
     if not USE_LLM:
         raise RuntimeError("LLM_DISABLED")
     delay = 2
     for _ in range(retries):
         try:
-            resp = client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are DevMate, a senior Python code reviewer. Reply with short 'Why' + 'Fix'.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.2,
-            )
+            async with sem:
+                resp = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": payload},
+                    ],
+                    temperature=0.2,
+                    response_format={"type": "json_object"},
+                )
             return resp.choices[0].message.content.strip()
         except Exception as e:
             msg = str(e).lower()
             if "rate" in msg or "quota" in msg:
-                time.sleep(delay)
+                await asyncio.sleep(delay)
                 delay = min(delay * 2, 16)
                 continue
             raise
     raise RuntimeError("LLM_RATE_LIMIT")
 
-def build_prompt(file_path, msg, line, symbol):
-    return (
-        f"File: {file_path}\nLine: {line}\nIssue: {msg}\nSymbol: {symbol}\n\n"
-        "Explain briefly why it’s a problem and give a minimal safe fix."
-    )
+async def _gather_chats(payloads):
+    # one client per event loop: asyncio.run() starts a fresh loop for every review, and
+    # pooled connections cannot outlive the loop that opened them
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    async with AsyncGroq(api_key=GROQ_API_KEY) as client:
+        return await asyncio.gather(*[_achat(client, p, sem) for p in payloads], return_exceptions=True)
+
+def prompt_key(payload: str) -> str:
+    return "prompt:" + hashlib.sha256(f"{MODEL}|{SYSTEM_PROMPT}|{payload}".encode()).hexdigest()
+
+def build_item(idx, kind, file_path, line, msg, symbol=""):
+    return {"id": idx, "kind": kind, "file": file_path, "line": line, "msg": msg, "symbol": symbol}
+
+def parse_batch(resp) -> dict:
+    """Map issue id -> suggestion from one batched reply; empty on any malformed output."""
+    if not isinstance(resp, str):
+        return {}
+    try:
+        items = json.loads(resp).get("suggestions", [])
+        return {int(it["id"]): str(it["suggestion"]).strip() for it in items if it.get("suggestion")}
+    except Exception:
+        return {}
 
 # -------- main reasoning --------
 def reason_over_findings(analysis: dict, max_llm_calls: int = 8) -> list:
-    suggestions = []
-    llm_budget = max_llm_calls
+    # collect every finding first, then review them in a few batched requests
+    jobs = []  # (issue, suggestion dict, llm item)
 
     # --- pylint ---
     for entry in analysis.get("pylint", []):
         f = entry["file"]
         for iss in entry.get("issues", [])[:max_llm_calls]:
             msg, line, sym = iss.get("message",""), iss.get("line",""), iss.get("symbol","")
-            prompt = build_prompt(f, msg, line, sym)
-            try:
-                suggestion = _chat(prompt) if llm_budget > 0 else offline_hint(iss)
-                llm_budget -= 1
-            except Exception:
-                suggestion = offline_hint(iss)
-            suggestions.append({"type":"pylint","file":f,"line":line,"message":msg,"suggestion":suggestion})
+            item = build_item(len(jobs), "pylint", f, line, msg, sym)
+            jobs.append((iss, {"type":"pylint","file":f,"line":line,"message":msg}, item))
 
     # --- bandit ---
     for iss in analysis.get("bandit", {}).get("results", [])[:3]:
         f = iss.get("filename",""); ln = iss.get("line_number",""); msg = iss.get("issue_text","")
-        prompt = f"Security issue in {f}:{ln}\n{msg}\nExplain risk + safe fix."
-        try:
-            suggestion = _chat(prompt) if llm_budget>0 else offline_hint(iss)
-            llm_budget -= 1
-        except Exception:
-            suggestion = offline_hint(iss)
-        suggestions.append({"type":"bandit","file":f,"line":ln,"message":msg,"suggestion":suggestion})
+        item = build_item(len(jobs), "security", f, ln, msg, iss.get("test_id",""))
+        jobs.append((iss, {"type":"bandit","file":f,"line":ln,"message":msg}, item))
 
     # --- radon ---
     for f, items in list(analysis.get("radon", {}).items())[:3]:
         for it in items[:2]:
             n, r, ln = it.get("name",""), it.get("rank",""), it.get("lineno","")
-            prompt = f"{f}:{ln} has complexity rank {r}. Suggest a refactor outline."
-            try:
-                suggestion = _chat(prompt) if llm_budget>0 else offline_hint(it)
-                llm_budget -= 1
-            except Exception:
-                suggestion = offline_hint(it)
-            suggestions.append({"type":"radon","file":f,"line":ln,"message":f"Complexity {r}","suggestion":suggestion})
+            item = build_item(len(jobs), "complexity", f, ln, f"{n} has complexity rank {r}; outline a refactor.")
+            jobs.append((it, {"type":"radon","file":f,"line":ln,"message":f"Complexity {r}"}, item))
+
+    # findings of the same kind share one suggestion; only unseen ones go to the LLM
+    keys = [class_key(item) for _, _, item in jobs]
+    answers = _cache_lookup(list(dict.fromkeys(keys)))
+    pending = {}
+    for k, (_, _, item) in zip(keys, jobs):
+        if k not in answers:
+            pending.setdefault(k, item)
 
+    # at most max_llm_calls batched requests; anything beyond gets offline hints
+    llm_items = list(pending.values())[:max_llm_calls * BATCH_SIZE] if USE_LLM else []
+    payloads = [json.dumps(llm_items[i:i + BATCH_SIZE]) for i in range(0, len(llm_items), BATCH_SIZE)]
+    if payloads:
+        # the disk cache is blocking I/O, so it is consulted before and after the event loop
+        pkeys = [prompt_key(p) for p in payloads]
+        replies = _cache_lookup(pkeys)
+        todo = [(k, p) for k, p in zip(pkeys, payloads) if k not in replies]
+        if todo:
+            responses = asyncio.run(_gather_chats([p for _, p in todo]))
+            fetched = {k: r for (k, _), r in zip(todo, responses) if isinstance(r, str)}
+            _cache_store(fetched)
+            replies.update(fetched)
+        by_id = {}
+        for k in pkeys:
+            by_id.update(parse_batch(replies.get(k)))
+        fresh = {k: by_id[item["id"]] for k, item in pending.items() if item["id"] in by_id}
+        answers.update(fresh)
+        _cache_store(fresh)
+
+    suggestions = []
+    for (iss, sug, _), k in zip(jobs, keys):
+        sug["suggestion"] = answers.get(k) or offline_hint(iss)
+        suggestions.append(sug)
     return suggestions
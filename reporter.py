@@ -1,9 +1,16 @@
-import os, time, re
+import os, sys, time, re, functools
 from fpdf import FPDF
 
+_CODE_BLOCK = re.compile(r"```(?:python)?(.*?)```", re.DOTALL)
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
 # ---------- Helpers ----------
+@functools.lru_cache(maxsize=1)
 def find_font():
-    """Try to find a Unicode TTF; return path or None."""
+    """Try to find a Unicode TTF; return path or None. Resolved once per process."""
+    if sys.platform != "win32":
+        print("⚠️ No system TTF font found — fallback Helvetica.")
+        return None
     win_fonts = r"C:\Windows\Fonts"
     candidates = [
         "arial.ttf", "arialuni.ttf", "segoeui.ttf", "calibri.ttf",
@@ -26,8 +33,11 @@ def sanitize(text):
         text = "\n".join(f"{k}: {v}" for k, v in text.items())
     elif not isinstance(text, str):
         text = str(text)
+    text = text or ""
+    if text.isascii():
+        return text
     # Strip unsupported Unicode (emojis, symbols) for fallback mode
-    return re.sub(r"[^\x00-\xFF]", "", text or "")
+    return text.encode("latin-1", "ignore").decode("latin-1")
 
 
 def clamp(s: str, lim: int = 4000) -> str:
@@ -51,7 +61,7 @@ def _render_pdf(pdf: FPDF, repo_url: str, suggestions: list, full_output, unicod
     def extract_code_blocks(text):
         """Extract code blocks (```python ... ```)."""
         text = flatten_text(text)
-        blocks = re.findall(r"```(?:python)?(.*?)```", text, re.DOTALL)
+        blocks = _CODE_BLOCK.findall(text)
         return [b.strip() for b in blocks if b.strip()]
 
     # --- PDF setup ---
@@ -99,7 +109,7 @@ def _render_pdf(pdf: FPDF, repo_url: str, suggestions: list, full_output, unicod
         # Extract and format body
         body_text = flatten_text(s.get("suggestion", "No detailed output."))
         codes = extract_code_blocks(body_text)
-        clean_body = re.sub(r"```(?:python)?(.*?)```", "", body_text, flags=re.DOTALL).strip()
+        clean_body = _CODE_BLOCK.sub("", body_text).strip()
 
         # Write recommendations
         if clean_body:
@@ -137,11 +147,18 @@ def _render_pdf(pdf: FPDF, repo_url: str, suggestions: list, full_output, unicod
         pdf.set_text_color(0, 0, 0)
         pdf.set_font("Auto" if unicode_mode else "Helvetica", "", 9)
 
-        # ✅ Flatten full_output safely
+        # ✅ Flatten full_output safely, then render line by line — one multi_cell over
+        # the whole log makes fpdf re-scan an ever-growing buffer for line breaks
         text = flatten_text(full_output)
         text = clamp(text, 20000)
-        text = re.sub(r"\x1b\[[0-9;]*m", "", text)
-        pdf.multi_cell(0, 4.5, sanitize(text))
+        for line in text.split("\n"):
+            line = line.rstrip()
+            if not line:
+                pdf.ln(2)
+                continue
+            if "\x1b" in line:
+                line = _ANSI.sub("", line)
+            pdf.multi_cell(0, 4.5, sanitize(line))
 
 
 def generate_pdf_report(repo_url: str, suggestions: list, full_output=None) -> str:
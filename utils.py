@@ -1,15 +1,144 @@
-import os, shutil, tempfile, time
+import os, json, shutil, tempfile, time, hashlib, contextlib
+from importlib import metadata
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to no cross-process locking
+    fcntl = None
 
-def make_workdir():
-    d = os.path.join(tempfile.gettempdir(), f"devmate_{int(time.time())}")
-    os.makedirs(d, exist_ok=True)
-    return d
+CACHE_ROOT = os.path.expanduser(os.getenv("DEVMATE_CACHE_DIR", "~/.devmate"))
+LOG_LEVEL = os.getenv("DEVMATE_LOG_LEVEL", "WARNING").upper()
+CLONE_TTL = 7 * 24 * 3600  # drop cached clones unused for a week
+
+# files that carry little review signal (tests, vendored and generated code) are not analyzed;
+# override with comma-separated substrings matched against the "/"-prefixed relative path
+SKIP_PATTERNS = [p for p in os.getenv(
+    "DEVMATE_SKIP_PATTERNS",
+    "/tests/,/test_,/vendor/,/third_party/,/.venv/,/venv/,site-packages,/setup.py,_pb2.py",
+).split(",") if p]
+MIN_FILE_BYTES = int(os.getenv("DEVMATE_MIN_FILE_BYTES", "64"))
+MAX_FILE_BYTES = int(os.getenv("DEVMATE_MAX_FILE_BYTES", "200000"))
+
+def clone_cache_dir(git_url):
+    key = hashlib.sha256(git_url.encode()).hexdigest()[:16]
+    return os.path.join(CACHE_ROOT, "clones", key)
+
+def sweep_clone_cache(max_age=CLONE_TTL):
+    root = os.path.join(CACHE_ROOT, "clones")
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        if name.endswith(".lock"):
+            continue
+        d = os.path.join(root, name)
+        try:
+            if os.stat(d).st_mtime >= cutoff:
+                continue
+            with open(d + ".lock", "a") as fh:
+                if fcntl:
+                    try:
+                        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # another request is using this clone right now
+                clean_dir(d)
+                os.remove(d + ".lock")
+        except OSError:
+            pass
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on <path>.lock, shared across processes (gunicorn workers)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        fh = open(path + ".lock", "a")
+        if not fcntl:
+            break
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        # the sweep may have deleted the lock file while we waited; lock the new one instead
+        try:
+            if os.fstat(fh.fileno()).st_ino == os.stat(path + ".lock").st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        fh.close()
+    try:
+        yield
+    finally:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+def available_cpus():
+    """CPUs this process may actually use: the affinity mask, capped by any cgroup CPU quota."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n = os.cpu_count() or 1
+    quota = period = None
+    try:  # cgroup v2
+        with open("/sys/fs/cgroup/cpu.max") as fh:
+            q, p = fh.read().split()[:2]
+        if q != "max":
+            quota, period = int(q), int(p)
+    except (OSError, ValueError):
+        try:  # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as fh:
+                q = int(fh.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as fh:
+                p = int(fh.read())
+            if q > 0 and p > 0:
+                quota, period = q, p
+        except (OSError, ValueError):
+            pass
+    if quota and period:
+        n = min(n, max(1, quota // period))
+    return max(1, n)
+
+def file_hash(path):
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+def tool_version(tool):
+    try:
+        return metadata.version(tool)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+def _result_path(tool, key):
+    return os.path.join(CACHE_ROOT, "cache", tool, tool_version(tool), f"{key}.json")
+
+def cache_get(tool, key):
+    """Return the cached analyzer output for key, or None on a miss."""
+    try:
+        with open(_result_path(tool, key), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def cache_put(tool, key, value):
+    path = _result_path(tool, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(value, fh)
+    os.replace(tmp, path)  # atomic, so concurrent readers never see a partial file
 
 def list_py_files(root):
-    for dirpath, _, files in os.walk(root):
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d != ".git"]
         for f in files:
-            if f.endswith(".py"):
-                yield os.path.join(dirpath, f)
+            if not f.endswith(".py"):
+                continue
+            p = os.path.join(dirpath, f)
+            rel = "/" + os.path.relpath(p, root).replace(os.sep, "/")
+            if any(pat in rel for pat in SKIP_PATTERNS):
+                continue
+            try:
+                if not MIN_FILE_BYTES <= os.path.getsize(p) <= MAX_FILE_BYTES:
+                    continue
+            except OSError:
+                continue
+            yield p
 
 def clean_dir(path):
     try: shutil.rmtree(path, ignore_errors=True)